@@ -10,18 +10,31 @@
 #############################################
 
 import os
-import json
+import re
+import sys
+import orjson
+import tempfile
+import uuid
 import datetime
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass
+from types import MappingProxyType
 
 import streamlit as st
-import matplotlib.pyplot as plt
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import numpy as np
-from PIL import Image
+import pandas as pd
 import calendar
+from collections import Counter, defaultdict, deque
 import smtplib
 from email.mime.text import MIMEText
 import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+import time
+import queue
 
 #############################################
 #           GLOBAL CONSTANTS / PATHS
@@ -37,8 +50,9 @@ USERS_FILE         = os.path.join(DATA_DIR, "users.json")
 TASKS_FILE         = os.path.join(DATA_DIR, "tasks.json")
 APPOINTMENTS_FILE  = os.path.join(DATA_DIR, "appointments.json")
 PRESCRIPTIONS_FILE = os.path.join(DATA_DIR, "prescriptions.json")
-MOOD_FILE          = os.path.join(DATA_DIR, "mood.json")
-WATER_FILE         = os.path.join(DATA_DIR, "water.json")
+# Append-only NDJSON logs, one [user, date, value] record per line
+MOOD_FILE          = os.path.join(DATA_DIR, "mood.jsonl")
+WATER_FILE         = os.path.join(DATA_DIR, "water.jsonl")
 NOTES_FILE         = os.path.join(DATA_DIR, "notes.json")
 STEPS_FILE         = os.path.join(DATA_DIR, "steps.json")
 SLEEP_FILE         = os.path.join(DATA_DIR, "sleep.json")
@@ -51,6 +65,37 @@ BLOODPRESSURE_FILE = os.path.join(DATA_DIR, "bloodpressure.json")
 # For Family/Circle Groups
 GROUPS_FILE = os.path.join(DATA_DIR, "groups.json")
 
+# Daily challenge completions
+CHALLENGES_FILE = os.path.join(DATA_DIR, "challenges.json")
+
+# Every persisted store by name, in load/save order
+DATA_FILES = {
+    "users":         USERS_FILE,
+    "tasks":         TASKS_FILE,
+    "appointments":  APPOINTMENTS_FILE,
+    "prescriptions": PRESCRIPTIONS_FILE,
+    "mood":          MOOD_FILE,
+    "water":         WATER_FILE,
+    "notes":         NOTES_FILE,
+    "steps":         STEPS_FILE,
+    "sleep":         SLEEP_FILE,
+    "weight":        WEIGHT_FILE,
+    "calories":      CALORIES_FILE,
+    "groups":        GROUPS_FILE,
+    "bloodpressure": BLOODPRESSURE_FILE,
+    "challenges":    CHALLENGES_FILE
+}
+
+# Stores shaped {user: {"YYYY-MM-DD": value}}
+DATE_KEYED_STORES = frozenset({
+    "tasks", "appointments", "mood", "water", "notes",
+    "steps", "sleep", "weight", "calories", "bloodpressure"
+})
+
+# Stores persisted as NDJSON logs: a log entry appends one line instead of
+# rewriting the whole file
+APPEND_LOG_STORES = frozenset({"mood", "water"})
+
 # If you have a banner image
 SPLASH_IMAGE_PATH = "path/to/splash_image.png"
 
@@ -62,28 +107,207 @@ st.set_page_config(page_title=APP_TITLE, layout="wide")
 
 def load_json(filepath):
     """Load JSON from a file safely; return {} if missing or invalid."""
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-    return {}
+    try:
+        with open(filepath, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return {}
+    # An empty file is the common "invalid" case; skip the parser for it
+    if not raw:
+        return {}
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return {}
+
+def intern_date_keys(data: dict) -> dict:
+    """Intern the "YYYY-MM-DD" keys of a {user: {date: value}} store so the
+    same date string is shared across stores and compares by identity."""
+    for user, per_date in data.items():
+        if isinstance(per_date, dict):
+            data[user] = {sys.intern(k): v for k, v in per_date.items()}
+    return data
+
+# A prescription "Schedule" maps each dose date to its status, in date order:
+#   {"YYYY-MM-DD": "scheduled", ...}
+EMPTY_SCHEDULE = MappingProxyType({})
+
+# Dose statuses, interned so every schedule shares one object per status
+RX_SCHEDULED, RX_TAKEN, RX_MISSED = map(sys.intern, ("scheduled", "taken on time", "missed"))
+RX_STATUSES = (RX_SCHEDULED, RX_TAKEN, RX_MISSED)
+
+def migrate_prescriptions(data: dict) -> dict:
+    """Convert older schedule layouts to {date: status}, in place: the
+    original list of {Day, Month, Year, Status} entries and the columnar
+    {"dates": [...], "statuses": [...]} form. The first entry for a date
+    wins, as it did for lookups in both."""
+    for user_rx in data.values():
+        for rx_info in user_rx.values():
+            sched = rx_info.get("Schedule")
+            if isinstance(sched, list):
+                pairs = ((f"{e['Year']:04d}-{e['Month']:02d}-{e['Day']:02d}", e.get("Status", RX_SCHEDULED))
+                         for e in sched)
+            elif isinstance(sched, dict) and isinstance(sched.get("dates"), list):
+                pairs = zip(sched["dates"], sched.get("statuses", ()))
+            elif isinstance(sched, dict):
+                pairs = sched.items()
+            else:
+                continue
+            converted = {}
+            for d_str, status in pairs:
+                converted.setdefault(d_str, status)
+            rx_info["Schedule"] = converted
+    return data
+
+def intern_schedules(data: dict) -> dict:
+    """Intern every schedule's dates and statuses, in place, so each status
+    is one of the RX_STATUSES objects and dates are shared with the other
+    stores' keys."""
+    for user_rx in data.values():
+        for rx_info in user_rx.values():
+            sched = rx_info.get("Schedule")
+            if isinstance(sched, dict):
+                rx_info["Schedule"] = {sys.intern(d): sys.intern(stt) for d, stt in sched.items()}
+    return data
+
+def new_note_id() -> str:
+    """Short random id for a note; stable across edits to other notes."""
+    return uuid.uuid4().hex[:8]
+
+def migrate_notes(data: dict) -> dict:
+    """Convert legacy per-day note lists to {note id: text} dicts, in place.
+    Ids come from list position so they stay the same on every reload
+    until the migrated store is first saved."""
+    for per_date in data.values():
+        for day, notes in per_date.items():
+            if isinstance(notes, list):
+                per_date[day] = {f"{i:08x}": txt for i, txt in enumerate(notes)}
+    return data
+
+# orjson serialises in native code and emits UTF-8 bytes directly. The
+# stores are only ever read back by the app, so they are written compact:
+# no indentation to emit, write or re-parse.
+JSON_DUMP_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
 
 def save_json(data, filepath):
-    """Save a dictionary to a JSON file."""
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
-
-def hash_password(password: str) -> str:
-    """Return a SHA-256 hash of a plaintext password."""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Save a dictionary to a JSON file atomically."""
+    write_atomic(orjson.dumps(data, option=JSON_DUMP_OPTIONS), filepath)
+
+def write_atomic(payload: bytes, filepath):
+    """Write a temp file, fsync it, then rename over the target so a crash
+    never leaves it torn."""
+    # A unique temp name per write, so two sessions saving the same store
+    # never write into each other's temp file
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(filepath) + ".",
+                                    suffix=".tmp", dir=os.path.dirname(filepath) or ".")
+    try:
+        # Unbuffered: the payload is already one bytes object, so hand it to
+        # write(2) directly instead of copying it through a buffer first
+        with open(fd, "wb", buffering=0) as f:
+            view = memoryview(payload)
+            while view:
+                view = view[f.write(view):]
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def read_log(filepath) -> tuple:
+    """Replay an NDJSON log of [user, date, value] records; returns
+    ({user: {date: value}}, number of lines). Later records win.
+    Unreadable lines (a write torn by a crash) are skipped."""
+    try:
+        with open(filepath, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return {}, 0
+    lines = [line for line in raw.splitlines() if line]
+    # One parse for the whole log; line by line only if some line is torn
+    try:
+        records = orjson.loads(b"[" + b",".join(lines) + b"]")
+    except orjson.JSONDecodeError:
+        records = []
+        for line in lines:
+            try:
+                records.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                continue
+    data = {}
+    for record in records:
+        try:
+            user, day, value = record
+        except (TypeError, ValueError):
+            continue
+        data.setdefault(user, {})[day] = value
+    return data, len(lines)
+
+def log_record(user: str, day: str, value) -> bytes:
+    """One NDJSON line."""
+    return orjson.dumps([user, day, value], option=JSON_DUMP_OPTIONS) + b"\n"
+
+def save_log(data: dict, filepath):
+    """Rewrite a log store atomically with one line per current entry.
+    Callers other than first-run setup hold _log_lock(), so no append
+    lands on the file being replaced."""
+    write_atomic(b"".join(log_record(user, day, value)
+                          for user, per_date in data.items()
+                          for day, value in per_date.items()), filepath)
+
+# A log is compacted on load once it has more than this many lines per live
+# entry (and at least LOG_COMPACT_MIN_LINES lines)
+LOG_COMPACT_RATIO = 2
+LOG_COMPACT_MIN_LINES = 256
+
+@st.cache_resource
+def _log_lock():
+    """Process-wide lock serialising appends to the NDJSON logs with
+    rewrites of them."""
+    return threading.Lock()
+
+def load_log(filepath) -> dict:
+    """Load a log store, first rewriting it with one line per live entry
+    if superseded records have piled up, so its size tracks the data
+    rather than the number of clicks."""
+    with _log_lock():
+        data, lines = read_log(filepath)
+        if lines > max(LOG_COMPACT_MIN_LINES, LOG_COMPACT_RATIO * sum(map(len, data.values()))):
+            save_log(data, filepath)
+    return data
+
+# Stored as "pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>"
+PASSWORD_SCHEME = "pbkdf2_sha256"
+PBKDF2_ITERATIONS = 600_000
+
+def hash_password(password: str, salt: bytes = None, iterations: int = PBKDF2_ITERATIONS) -> str:
+    """Return a salted PBKDF2-SHA256 hash of a plaintext password."""
+    if salt is None:
+        salt = os.urandom(16)
+    dk = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{PASSWORD_SCHEME}${iterations}${salt.hex()}${dk.hex()}"
+
+def verify_password(password: str, stored: str) -> bool:
+    """Check a password against a stored hash; also accepts the legacy
+    unsalted SHA-256 hex digests."""
+    if stored.startswith(PASSWORD_SCHEME + "$"):
+        _, iterations, salt_hex, _ = stored.split("$")
+        candidate = hash_password(password, bytes.fromhex(salt_hex), int(iterations))
+    else:
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(candidate, stored)
 
 def check_credentials(username: str, password: str, users_data: dict) -> bool:
-    """Validate user credentials. Return True if correct, else False."""
-    if username in users_data:
-        return hash_password(password) == users_data[username]["password"]
-    return False
+    """Validate user credentials. Return True if correct, else False.
+    A legacy SHA-256 hash is upgraded to PBKDF2 on successful login."""
+    if username not in users_data:
+        return False
+    stored = users_data[username]["password"]
+    if not verify_password(password, stored):
+        return False
+    if not stored.startswith(PASSWORD_SCHEME + "$"):
+        users_data[username]["password"] = hash_password(password)
+        save_json(users_data, USERS_FILE)
+    return True
 
 def register_new_user(username: str, password: str, users_data: dict) -> bool:
     """Register a new user. Return False if user already exists, else True."""
@@ -114,35 +338,165 @@ def register_new_user(username: str, password: str, users_data: dict) -> bool:
 #            LOAD ALL DATA
 #############################################
 
-users_data         = load_json(USERS_FILE)
-tasks_data         = load_json(TASKS_FILE)
-appointments_data  = load_json(APPOINTMENTS_FILE)
-prescriptions_data = load_json(PRESCRIPTIONS_FILE)
-mood_data          = load_json(MOOD_FILE)
-water_data         = load_json(WATER_FILE)
-notes_data         = load_json(NOTES_FILE)
-steps_data         = load_json(STEPS_FILE)
-sleep_data         = load_json(SLEEP_FILE)
-weight_data        = load_json(WEIGHT_FILE)
-calories_data      = load_json(CALORIES_FILE)
-groups_data        = load_json(GROUPS_FILE)
-bloodpressure_data = load_json(BLOODPRESSURE_FILE)
-
-def save_all():
-    """Save all data structures to their respective JSON files."""
-    save_json(users_data, USERS_FILE)
-    save_json(tasks_data, TASKS_FILE)
-    save_json(appointments_data, APPOINTMENTS_FILE)
-    save_json(prescriptions_data, PRESCRIPTIONS_FILE)
-    save_json(mood_data, MOOD_FILE)
-    save_json(water_data, WATER_FILE)
-    save_json(notes_data, NOTES_FILE)
-    save_json(steps_data, STEPS_FILE)
-    save_json(sleep_data, SLEEP_FILE)
-    save_json(weight_data, WEIGHT_FILE)
-    save_json(calories_data, CALORIES_FILE)
-    save_json(groups_data, GROUPS_FILE)
-    save_json(bloodpressure_data, BLOODPRESSURE_FILE)
+@st.cache_resource
+def ensure_data_files(paths: tuple):
+    """Create every missing store as {} once per process, so steady-state
+    loads never take the FileNotFoundError path."""
+    for path in paths:
+        if os.path.exists(path):
+            continue
+        if path.endswith(".jsonl"):
+            # Log stores used to be plain .json dicts; carry any old data over
+            save_log(load_json(os.path.splitext(path)[0] + ".json"), path)
+        else:
+            save_json({}, path)
+
+ensure_data_files(tuple(DATA_FILES.values()))
+
+def file_version(path: str) -> tuple:
+    """(inode, mtime_ns, size) of a file; changes whenever it is replaced or
+    appended to. The inode makes replacements exact: every save_json() is an
+    os.replace() onto a fresh inode, even when two same-size writes land
+    within one mtime tick."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return (0, 0, 0)
+    return (info.st_ino, info.st_mtime_ns, info.st_size)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_store(name: str, path: str, version: tuple) -> dict:
+    """Parse and normalise one store. Cached per file version, so reruns
+    only re-read a file after it has been written; each call still hands
+    back a private copy that the caller is free to mutate."""
+    data = load_log(path) if name in APPEND_LOG_STORES else load_json(path)
+    if name == "notes":
+        data = migrate_notes(data)
+    elif name == "prescriptions":
+        data = migrate_prescriptions(data)
+    elif name == "challenges":
+        # Drop the empty dates that earlier lookups wrote back
+        data = {day: chs for day, chs in data.items() if chs}
+    return data
+
+@st.cache_resource
+def _loader_pool() -> ThreadPoolExecutor:
+    """Process-wide worker threads for reading stores in parallel."""
+    return ThreadPoolExecutor(max_workers=6, thread_name_prefix="store-load")
+
+def _load_store_in_ctx(ctx, name: str, version: tuple) -> dict:
+    """Worker body: attach the rerun's script context, which st.cache_data
+    needs off the main thread, then load one store."""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return load_store(name, DATA_FILES[name], version)
+
+# This session's stores as {name: (file version, data)}, kept across
+# reruns. Bound once here: after st.stop() every session_state access
+# raises again, and save_stores() still has to reach it from main()'s finally.
+_session_stores = st.session_state.setdefault("_stores", {})
+
+def intern_store(name: str, data: dict) -> dict:
+    """Intern a loaded store's repeated strings. Runs on the copy that
+    st.cache_data hands back: strings interned inside load_store() would be
+    fresh objects again once the cached value is unpickled."""
+    if name in DATE_KEYED_STORES:
+        data = intern_date_keys(data)
+    elif name == "prescriptions":
+        data = intern_schedules(data)
+    return data
+
+def refresh_stores(names) -> None:
+    """Bring this session's copies of the named stores up to date with disk.
+    Only stores whose file changed since they were loaded are re-read, and
+    those are independent, so they load concurrently. A reloaded store is
+    swapped into the existing dict in place: fragment reruns still hold the
+    last full rerun's module globals, and must see the new data too. Stores
+    with unsaved changes this rerun are left alone."""
+    held = _session_stores
+    versions = {name: file_version(DATA_FILES[name]) for name in names if name not in _dirty}
+    stale = [name for name, version in versions.items()
+             if name not in held or held[name][0] != version]
+    if not stale:
+        return
+    loaded = _loader_pool().map(_load_store_in_ctx, repeat(get_script_run_ctx()),
+                                stale, [versions[name] for name in stale])
+    for name, data in zip(stale, loaded):
+        data = intern_store(name, data)
+        if name in held:
+            current = held[name][1]
+            current.clear()
+            current.update(data)
+            data = current
+        held[name] = (versions[name], data)
+
+def load_all_data() -> dict:
+    """Load every store listed in DATA_FILES; returns {store name: data}.
+    A session reuses its own stores and re-reads only those whose file has
+    changed since, so a steady-state rerun costs one stat() per store and
+    no copy."""
+    refresh_stores(DATA_FILES)
+    return {name: _session_stores[name][1] for name in DATA_FILES}
+
+# Store names changed this rerun; main() flushes them once at the end
+_dirty = set()
+
+_stores = load_all_data()
+
+users_data         = _stores["users"]
+tasks_data         = _stores["tasks"]
+appointments_data  = _stores["appointments"]
+prescriptions_data = _stores["prescriptions"]
+mood_data          = _stores["mood"]
+water_data         = _stores["water"]
+notes_data         = _stores["notes"]
+steps_data         = _stores["steps"]
+sleep_data         = _stores["sleep"]
+weight_data        = _stores["weight"]
+calories_data      = _stores["calories"]
+groups_data        = _stores["groups"]
+bloodpressure_data = _stores["bloodpressure"]
+
+def save_stores(*names: str):
+    """Save the named stores to their JSON files."""
+    for name in names:
+        path = DATA_FILES[name]
+        if name in APPEND_LOG_STORES:
+            with _log_lock():
+                save_log(_stores[name], path)
+        else:
+            save_json(_stores[name], path)
+        # The session's copy is what was just written; don't re-read it
+        _session_stores[name] = (file_version(path), _stores[name])
+
+def append_log(name: str, user: str, day: str, value):
+    """Set one entry of a log store and persist it by appending a single
+    line, rather than deferring a rewrite of the whole file."""
+    _stores[name].setdefault(user, {})[day] = value
+    path = DATA_FILES[name]
+    with _log_lock():
+        before = file_version(path)
+        with open(path, "a+b") as f:
+            record = log_record(user, day, value)
+            # A crash mid-append can leave the last line unterminated; close it
+            # off so this record doesn't get glued onto it
+            if before[2]:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    record = b"\n" + record
+            f.write(record)
+        # Only skip the re-read if nobody else appended since this session loaded
+        if _session_stores[name][0] == before:
+            _session_stores[name] = (file_version(path), _stores[name])
+
+def mark_dirty(*names: str):
+    """Record that stores changed; the write is deferred to flush_if_dirty()."""
+    _dirty.update(names)
+
+def flush_if_dirty():
+    """Save only the stores marked dirty during this rerun."""
+    if _dirty:
+        save_stores(*_dirty)
+        _dirty.clear()
 
 st.title(APP_TITLE)
 
@@ -150,25 +504,36 @@ st.title(APP_TITLE)
 #    SYMPTOM CHECKER (DEMO ONLY, NOT REAL MEDICAL ADVICE)
 ###########################################################
 
+# One compiled alternation scans for every keyword in a single pass
+_SYMPTOM_RE = re.compile(
+    r"(?P<cold>cough|sore throat)|(?P<fever>fever)|(?P<headache>headache)"
+    r"|(?P<chest>chest pain|shortness of breath)|(?P<rash>rash)",
+    re.IGNORECASE
+)
+_SYMPTOM_FLAGS = {"cold": 1, "fever": 2, "headache": 4, "chest": 8, "rash": 16}
+_FEVER_AND_HEADACHE = _SYMPTOM_FLAGS["fever"] | _SYMPTOM_FLAGS["headache"]
+
 def symptom_checker(symptoms: list) -> str:
     """
     A naive function that tries to guess possible conditions
     based on a list of textual symptoms.
     This is purely for demonstration; it is NOT medical advice.
     """
-    # Lowercase everything
-    symptoms = [s.lower().strip() for s in symptoms]
+    # Newline-join so a keyword can never span two symptoms
+    flags = 0
+    for m in _SYMPTOM_RE.finditer("\n".join(symptoms)):
+        flags |= _SYMPTOM_FLAGS[m.lastgroup]
 
     possible_conditions = []
 
     # Very basic mapping logic, purely for example
-    if any("cough" in s for s in symptoms) or any("sore throat" in s for s in symptoms):
+    if flags & _SYMPTOM_FLAGS["cold"]:
         possible_conditions.append("Common Cold / Flu")
-    if any("fever" in s for s in symptoms) and any("headache" in s for s in symptoms):
+    if flags & _FEVER_AND_HEADACHE == _FEVER_AND_HEADACHE:
         possible_conditions.append("Viral infection")
-    if any("chest pain" in s for s in symptoms) or any("shortness of breath" in s for s in symptoms):
+    if flags & _SYMPTOM_FLAGS["chest"]:
         possible_conditions.append("Cardiac or Respiratory issue")
-    if any("rash" in s for s in symptoms):
+    if flags & _SYMPTOM_FLAGS["rash"]:
         possible_conditions.append("Dermatitis / Allergic reaction")
 
     if not possible_conditions:
@@ -182,36 +547,61 @@ def symptom_checker(symptoms: list) -> str:
 #   NOTIFICATIONS & TRENDS (Optional)
 ###########################################################
 
-def parse_task_datetime(date_str: str, time_str: str):
-    """Parse date+time, e.g. '2025-01-12' + '14:30' => datetime obj."""
-    try:
-        dt_str = f"{date_str} {time_str}"
-        return datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-    except:
-        return None
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{1,2})")
 
-def parse_appointment_datetime(date_str: str, app_str: str):
-    """Parse the time from an appointment string. E.g. '15:00 with Dr. X'."""
-    try:
-        time_part = app_str.split(" ")[0]
-        dt_str = f"{date_str} {time_part}"
-        return datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-    except:
+def time_of_day_seconds(time_str: str):
+    """Seconds after midnight for an 'H:MM' time, or None if it isn't one."""
+    m = _TIME_RE.fullmatch(time_str)
+    if m is None:
         return None
+    hh, mm = int(m[1]), int(m[2])
+    if hh > 23 or mm > 59:
+        return None
+    return hh * 3600 + mm * 60
+
+TREND_DAYS = 3
+
+def trend_window() -> list:
+    """The TREND_DAYS days before today as ISO strings, oldest first."""
+    return recent_dates(st.session_state["_today_str"], TREND_DAYS + 1)[:TREND_DAYS]
+
+def trailing_stats(name: str, username: str, per_date: dict) -> tuple:
+    """(sum, count) of the values logged over trend_window().
+
+    Kept as a sliding window in session state: on a one-day rollover the
+    oldest day is subtracted and yesterday added, instead of re-reading the
+    whole window. Only today's entry is ever written, and today is outside
+    the window, so the running totals stay valid between rollovers."""
+    today_str = st.session_state["_today_str"]
+    windows = st.session_state.setdefault("_trend_windows", {})
+    state = windows.get((name, username))
+    if state is not None and state["end"] == today_str:
+        return state["sum"], state["count"]
+
+    dates = trend_window()
+    if state is not None and state["window"][-1][0] == dates[-2]:
+        _, old_val = state["window"].popleft()
+        if old_val is not None:
+            state["sum"] -= old_val
+            state["count"] -= 1
+        new_val = per_date.get(dates[-1])
+        state["window"].append((dates[-1], new_val))
+        if new_val is not None:
+            state["sum"] += new_val
+            state["count"] += 1
+    else:
+        window = deque(((d_str, per_date.get(d_str)) for d_str in dates), maxlen=TREND_DAYS)
+        vals = [v for _, v in window if v is not None]
+        state = windows[(name, username)] = {"window": window, "sum": sum(vals), "count": len(vals)}
+    state["end"] = today_str
+    return state["sum"], state["count"]
 
 def check_water_trend(username: str):
     """If average water intake is <1.0L last 3 days, warn user."""
     user_water = water_data.get(username, {})
     if not user_water:
         return None
-    now = datetime.now()
-    total = 0.0
-    count = 0
-    for i in range(1,4):
-        d_str = (now - timedelta(days=i)).strftime("%Y-%m-%d")
-        if d_str in user_water:
-            total += user_water[d_str]
-            count += 1
+    total, count = trailing_stats("water", username, user_water)
     if count == 0:
         return None
     avg = total / count
@@ -224,21 +614,93 @@ def check_mood_trend(username: str):
     user_mood = mood_data.get(username, {})
     if not user_mood:
         return None
-    now = datetime.now()
-    moods = []
-    for i in range(1,4):
-        d_str = (now - timedelta(days=i)).strftime("%Y-%m-%d")
-        if d_str in user_mood:
-            moods.append(user_mood[d_str])
-    if len(moods) < 2:
+    total, count = trailing_stats("mood", username, user_mood)
+    if count < 2:
         return None
-    avg = sum(moods)/len(moods)
+    avg = total / count
     if avg < 2:
         return "Your recent mood is low. Consider self-care or professional support."
     return None
 
-def send_email_notifications(username: str, messages: list):
-    """Send an email with the given messages to user's stored email (if configured)."""
+@st.cache_resource
+def _smtp_connections():
+    """Process-wide pool of logged-in SMTP connections keyed by (host, port, user);
+    values are (server, last used monotonic time)."""
+    return {}, threading.Lock()
+
+# Pooled connections idle longer than this are closed rather than reused
+SMTP_IDLE_TTL = 60.0
+
+def _close_quietly(server):
+    """QUIT an SMTP connection, ignoring one that is already dead."""
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        pass
+
+def _checkout_smtp(host: str, port: int, user: str, password: str):
+    """Take this account's pooled connection if it is still live, or open,
+    STARTTLS and log in a new one. The pool lock is held only while the pool
+    itself is touched, never across network I/O, so sessions don't queue
+    behind each other's sends; the caller owns the connection until
+    _checkin_smtp() returns it."""
+    conns, lock = _smtp_connections()
+    now = time.monotonic()
+    with lock:
+        stale = [conns.pop(k)[0] for k, (_, used) in list(conns.items()) if now - used > SMTP_IDLE_TTL]
+        entry = conns.pop((host, port, user), None)
+    for old in stale:
+        _close_quietly(old)
+
+    if entry is not None:
+        server = entry[0]
+        try:
+            if server.noop()[0] == 250:
+                return server
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close_quietly(server)
+    server = smtplib.SMTP(host, port, timeout=30)
+    try:
+        server.starttls()
+        server.login(user, password)
+    except BaseException:
+        _close_quietly(server)
+        raise
+    return server
+
+def _checkin_smtp(key: tuple, server):
+    """Put a connection back in the pool after a successful send."""
+    conns, lock = _smtp_connections()
+    with lock:
+        previous = conns.get(key)
+        conns[key] = (server, time.monotonic())
+    # Another send for the same account may have returned one meanwhile
+    if previous is not None:
+        _close_quietly(previous[0])
+
+def _deliver_email(ctx, smtp_conf: dict, msg_obj, results: queue.Queue):
+    """Worker thread body: attach the rerun's script context, which the
+    st.cache_resource connection pool needs off the main thread, then send
+    one message and report the outcome on `results`."""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    key = (smtp_conf["host"], smtp_conf["port"], smtp_conf["username"])
+    server = None
+    try:
+        server = _checkout_smtp(*key, smtp_conf["app_password"])
+        server.send_message(msg_obj)
+    except Exception as e:
+        # A connection that failed mid-send is closed, not pooled
+        if server is not None:
+            _close_quietly(server)
+        results.put(("error", f"Error sending email: {e}"))
+        return
+    _checkin_smtp(key, server)
+    results.put(("success", "Email alerts sent."))
+
+def send_email_notifications(username: str, messages: list) -> bool:
+    """Queue an email with the given messages to user's stored email (if configured).
+    Delivery runs on a background thread; returns True if it was started."""
     user_email = users_data[username]["profile"].get("email","")
     smtp_conf  = users_data[username].get("smtp", {})
     smtp_host  = smtp_conf.get("host","")
@@ -248,7 +710,7 @@ def send_email_notifications(username: str, messages: list):
 
     if not (user_email and smtp_host and smtp_user and smtp_pass):
         st.error("Cannot send email: missing or incomplete SMTP configuration.")
-        return
+        return False
 
     subject = f"WellNest Notifications for {username}"
     body = "Hello,\n\nHere are your WellNest notifications:\n"
@@ -261,32 +723,41 @@ def send_email_notifications(username: str, messages: list):
     msg_obj["From"]    = smtp_user
     msg_obj["To"]      = user_email
 
-    try:
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.send_message(msg_obj)
-    except Exception as e:
-        st.error(f"Error sending email: {e}")
+    conf = {"host": smtp_host, "port": smtp_port, "username": smtp_user, "app_password": smtp_pass}
+    results = st.session_state.setdefault("_email_results", queue.Queue())
+    threading.Thread(target=_deliver_email, args=(get_script_run_ctx(), conf, msg_obj, results), daemon=True).start()
+    return True
+
+def show_email_results():
+    """Surface outcomes of background email sends finished since the last rerun."""
+    results = st.session_state.get("_email_results")
+    if results is None:
+        return
+    while not results.empty():
+        kind, text = results.get_nowait()
+        st.toast(text, icon="✅" if kind == "success" else "⚠️")
 
 def check_and_trigger_notifications(username: str):
     """Check tasks/appointments within 1 day or 1 hr; also check water/mood trends."""
     upcoming_events = []
-    now = datetime.now()
+    now = st.session_state["_now"]
 
     user_tasks = tasks_data.get(username, {})
     user_apps  = appointments_data.get(username, {})
 
-    for day_offset in [0,1]:
-        dt_candidate = now + timedelta(days=day_offset)
-        date_str = dt_candidate.strftime("%Y-%m-%d")
+    today = now.date()
+    for day in (today, today + timedelta(days=1)):
+        date_str = day.isoformat()
+        # Seconds from now to that day's midnight, computed once; each item
+        # then only adds its own time of day
+        midnight_diff = (datetime(day.year, day.month, day.day) - now).total_seconds()
 
         # tasks
         if date_str in user_tasks:
             for tsk in user_tasks[date_str]:
-                dt_obj = parse_task_datetime(date_str, tsk.get("time",""))
-                if dt_obj:
-                    diff = (dt_obj - now).total_seconds()
+                secs = time_of_day_seconds(tsk.get("time",""))
+                if secs is not None:
+                    diff = midnight_diff + secs
                     if 0 < diff <= 3600:
                         upcoming_events.append(f"[1-Hour Alert] Task '{tsk['name']}' at {tsk['time']}")
                     elif 3600 < diff <= 86400:
@@ -295,9 +766,9 @@ def check_and_trigger_notifications(username: str):
         # appointments
         if date_str in user_apps:
             for app_str in user_apps[date_str]:
-                dt_obj = parse_appointment_datetime(date_str, app_str)
-                if dt_obj:
-                    diff = (dt_obj - now).total_seconds()
+                secs = time_of_day_seconds(app_str.partition(" ")[0])
+                if secs is not None:
+                    diff = midnight_diff + secs
                     if 0 < diff <= 3600:
                         upcoming_events.append(f"[1-Hour Alert] Appointment: {app_str}")
                     elif 3600 < diff <= 86400:
@@ -316,8 +787,8 @@ def check_and_trigger_notifications(username: str):
         for evt in upcoming_events:
             st.info(evt)
         if st.button("Send Email Alerts"):
-            send_email_notifications(username, upcoming_events)
-            st.success("Email alerts sent.")
+            if send_email_notifications(username, upcoming_events):
+                st.success("Sending email alerts in the background.")
     else:
         st.info("No new alerts at this time.")
 
@@ -333,6 +804,25 @@ def check_and_trigger_notifications(username: str):
 #############################################
 #   FAMILY GROUP / CIRCLE FEATURES
 #############################################
+def build_user_groups_index() -> dict:
+    """Reverse index username -> {group_id: None}, in groups_data order.
+    The inner dict acts as an insertion-ordered set."""
+    index = {}
+    for gid, info in groups_data.items():
+        for member in info["members"]:
+            index.setdefault(member, {})[gid] = None
+    return index
+
+# Built on first use, so reruns that never touch groups skip the scan
+_USER_GROUPS = None
+
+def user_groups_index() -> dict:
+    """The username -> groups reverse index, built lazily once per rerun."""
+    global _USER_GROUPS
+    if _USER_GROUPS is None:
+        _USER_GROUPS = build_user_groups_index()
+    return _USER_GROUPS
+
 def create_group(group_id: str, group_name: str):
     if group_id in groups_data:
         return False
@@ -340,32 +830,32 @@ def create_group(group_id: str, group_name: str):
         "group_name": group_name,
         "members": []
     }
-    save_all()
+    mark_dirty("groups")
     return True
 
 def join_group(group_id: str, username: str):
     if group_id not in groups_data:
         return False
-    if username not in groups_data[group_id]["members"]:
+    user_groups = user_groups_index().setdefault(username, {})
+    if group_id not in user_groups:
         groups_data[group_id]["members"].append(username)
-        save_all()
+        user_groups[group_id] = None
+        mark_dirty("groups")
     return True
 
 def leave_group(group_id: str, username: str):
     if group_id not in groups_data:
         return False
-    if username in groups_data[group_id]["members"]:
+    user_groups = user_groups_index().get(username, {})
+    if group_id in user_groups:
+        del user_groups[group_id]
         groups_data[group_id]["members"].remove(username)
-        save_all()
+        mark_dirty("groups")
     return True
 
 def list_user_groups(username: str):
     """Return list of (group_id, group_name) for groups user is in."""
-    result = []
-    for gid, info in groups_data.items():
-        if username in info["members"]:
-            result.append((gid, info["group_name"]))
-    return result
+    return [(gid, groups_data[gid]["group_name"]) for gid in user_groups_index().get(username, ())]
 
 def family_group_view(username: str):
     st.header("Family / Circle Groups")
@@ -419,7 +909,7 @@ def family_group_view(username: str):
 
 def show_limited_stats(username: str):
     """Show minimal daily stats for user in the group context."""
-    today_str = datetime.now().strftime("%Y-%m-%d")
+    today_str = st.session_state["_today_str"]
 
     w_val = water_data.get(username, {}).get(today_str, 0.0)
     st.write(f"- Water: {w_val} L")
@@ -443,23 +933,21 @@ def show_limited_stats(username: str):
 #           DAILY CHALLENGES
 #############################################
 
-daily_challenges = {}
+# Persisted like the other stores so completions survive reruns and restarts
+daily_challenges = _stores["challenges"]
 # Example predefined
-daily_challenges["2025-01-14"] = [
+daily_challenges.setdefault("2025-01-14", [
     {"challenge": "Drink 2L of water", "completed_by": []},
     {"challenge": "Log Mood Today",    "completed_by": []},
     {"challenge": "Walk 8000 Steps",   "completed_by": []}
-]
+])
 
 def get_challenges_for_date(date_str: str):
-    if date_str not in daily_challenges:
-        # optionally define new ones or leave blank
-        daily_challenges[date_str] = []
-    return daily_challenges[date_str]
+    return daily_challenges.get(date_str, [])
 
 def show_daily_challenges(username: str):
     st.subheader("Daily Challenges")
-    today_str = datetime.now().strftime("%Y-%m-%d")
+    today_str = st.session_state["_today_str"]
     challenges = get_challenges_for_date(today_str)
 
     if not challenges:
@@ -473,6 +961,7 @@ def show_daily_challenges(username: str):
                 st.write("   Status: Incomplete")
                 if st.button(f"Complete '{ch['challenge']}'", key=f"challenge_{i}"):
                     ch["completed_by"].append(username)
+                    mark_dirty("challenges")
                     st.success("Challenge completed!")
                     st.stop()
 
@@ -486,12 +975,27 @@ if "logged_in" not in st.session_state:
 if "current_user" not in st.session_state:
     st.session_state["current_user"] = None
 
+def refresh_clock():
+    """Read the clock once and publish the time, date and interned ISO date
+    in session state; everything a rerun renders reads them from there."""
+    now = datetime.now()
+    st.session_state["_now"] = now
+    st.session_state["_today"] = now.date()
+    st.session_state["_today_str"] = sys.intern(now.date().isoformat())
+
 def main():
-    if not st.session_state["logged_in"]:
-        show_login_screen()
-    else:
-        check_and_trigger_notifications(st.session_state["current_user"])
-        show_main_app()
+    refresh_clock()
+
+    try:
+        if not st.session_state["logged_in"]:
+            show_login_screen()
+        else:
+            show_email_results()
+            check_and_trigger_notifications(st.session_state["current_user"])
+            show_main_app()
+    finally:
+        # Also runs when a handler ends the script early with st.stop()/st.rerun()
+        flush_if_dirty()
 
 def show_login_screen():
     st.title("Welcome to WellNest - Please Login")
@@ -557,51 +1061,89 @@ def show_main_app():
     elif menu == "Settings":
         show_settings_tab()
 
+#############################################
+#  TODAY'S SNAPSHOT (ONE LOOKUP PASS)
+#############################################
+@dataclass(frozen=True, slots=True)
+class DailySnapshot:
+    """All of one user's metrics for a single day, gathered in one pass."""
+    bmi: float | None
+    sys_bp: int | None
+    dia_bp: int | None
+    steps: int
+    water: float
+    mood: int | None
+    tasks: tuple
+    apps: tuple
+    bp: dict | None
+
+def user_today_snapshot(username: str, today_str: str) -> DailySnapshot:
+    """Collect the day's entries from every data store for the given user."""
+    weight_entry = weight_data.get(username, {}).get(today_str)
+    bp_entry = bloodpressure_data.get(username, {}).get(today_str)
+    return DailySnapshot(
+        bmi=weight_entry["bmi"] if weight_entry else None,
+        sys_bp=bp_entry["systolic"] if bp_entry else None,
+        dia_bp=bp_entry["diastolic"] if bp_entry else None,
+        steps=steps_data.get(username, {}).get(today_str, 0),
+        water=water_data.get(username, {}).get(today_str, 0.0),
+        mood=mood_data.get(username, {}).get(today_str),
+        tasks=tuple(tasks_data.get(username, {}).get(today_str, ())),
+        apps=tuple(appointments_data.get(username, {}).get(today_str, ())),
+        bp=bp_entry
+    )
+
 #############################################
 #  BUILD A "HEALTH STATUS" HELPER
 #############################################
-def get_health_status(username: str) -> str:
+# Bit flags returned by classify_concerns()
+CONCERN_BMI        = 1
+CONCERN_HIGH_BP    = 2
+CONCERN_LOW_BP     = 4
+CONCERN_LOW_STEPS  = 8
+CONCERN_LOW_WATER  = 16
+
+CONCERN_LABELS = (
+    (CONCERN_BMI,       "BMI out of normal range"),
+    (CONCERN_HIGH_BP,   "High Blood Pressure"),
+    (CONCERN_LOW_BP,    "Low Blood Pressure"),
+    (CONCERN_LOW_STEPS, "Low activity (under 3000 steps)"),
+    (CONCERN_LOW_WATER, "Low water intake (<1L)")
+)
+
+def classify_concerns(bmi, sys_bp, dia_bp, steps, water):
+    """
+    Single-pass threshold check over scalars or equal-length arrays (use NaN
+    for a missing BMI/BP reading). Returns a uint8 bitmask of CONCERN_* flags
+    per sample, so a whole history can be classified in one vectorised call.
+    """
+    bmi, sys_bp, dia_bp, steps, water = (
+        np.asarray(x, dtype=np.float64) for x in (bmi, sys_bp, dia_bp, steps, water)
+    )
+    # We'll consider normal if ~120/80, high if systolic>140 or diastolic>90
+    has_bp = ~(np.isnan(sys_bp) | np.isnan(dia_bp))
+    flags = (np.where((bmi < 18.5) | (bmi > 25), CONCERN_BMI, 0)
+             | np.where(has_bp & ((sys_bp > 140) | (dia_bp > 90)), CONCERN_HIGH_BP, 0)
+             | np.where(has_bp & ((sys_bp < 90) | (dia_bp < 60)), CONCERN_LOW_BP, 0)
+             | np.where(steps < 3000, CONCERN_LOW_STEPS, 0)
+             | np.where(water < 1.0, CONCERN_LOW_WATER, 0))
+    return flags.astype(np.uint8)
+
+def get_health_status(snap: DailySnapshot) -> str:
     """
     Very basic logic to say "Healthy" or "Some concerns" based on
     recent metrics: BMI, blood pressure, steps, water, etc.
     This is purely demonstrative, not medical advice.
     """
-    today_str = datetime.now().strftime("%Y-%m-%d")
-
-    # 1) BMI
-    user_bmi = None
-    if today_str in weight_data.get(username, {}):
-        user_bmi = weight_data[username][today_str]["bmi"]
-
-    # 2) Blood Pressure
-    bp_entry = bloodpressure_data.get(username, {}).get(today_str, None)
-    # We'll consider normal if ~120/80, high if systolic>140 or diastolic>90
-    if bp_entry:
-        sys_bp = bp_entry["systolic"]
-        dia_bp = bp_entry["diastolic"]
-    else:
-        sys_bp, dia_bp = None, None
-
-    # 3) Steps
-    steps_val = steps_data.get(username, {}).get(today_str, 0)
-
-    # 4) Water
-    water_val = water_data.get(username, {}).get(today_str, 0.0)
-
-    # Evaluate
-    concerns = []
-    if user_bmi is not None:
-        if user_bmi < 18.5 or user_bmi > 25:
-            concerns.append("BMI out of normal range")
-    if sys_bp is not None and dia_bp is not None:
-        if sys_bp > 140 or dia_bp > 90:
-            concerns.append("High Blood Pressure")
-        if sys_bp < 90 or dia_bp < 60:
-            concerns.append("Low Blood Pressure")
-    if steps_val < 3000:
-        concerns.append("Low activity (under 3000 steps)")
-    if water_val < 1.0:
-        concerns.append("Low water intake (<1L)")
+    nan = float("nan")
+    flags = int(classify_concerns(
+        nan if snap.bmi is None else snap.bmi,
+        nan if snap.sys_bp is None else snap.sys_bp,
+        nan if snap.dia_bp is None else snap.dia_bp,
+        snap.steps,
+        snap.water
+    ))
+    concerns = [label for bit, label in CONCERN_LABELS if flags & bit]
 
     if concerns:
         return "Potential Concerns: " + ", ".join(concerns)
@@ -614,23 +1156,25 @@ def get_health_status(username: str) -> str:
 def show_home_tab():
     st.header("Home / Dashboard")
     user = st.session_state["current_user"]
-    today_str = datetime.now().strftime("%Y-%m-%d")
+    today_str = st.session_state["_today_str"]
+    snap = user_today_snapshot(user, today_str)
 
     # Display Health Status
     st.subheader("Overall Health Status (Demo)")
-    health_message = get_health_status(user)
+    health_message = get_health_status(snap)
     st.write(f"**{health_message}** (Not medical advice)")
 
     # Monthly Calendar
-    now = datetime.now()
+    today = st.session_state["_today"]
     with st.expander("Monthly Overview Calendar"):
         colCal1, colCal2 = st.columns(2)
         with colCal1:
-            picked_year = st.number_input("Year", value=now.year, min_value=1900, max_value=2100)
+            picked_year = st.number_input("Year", value=today.year, min_value=1900, max_value=2100)
         with colCal2:
-            picked_month = st.selectbox("Month", list(range(1,13)), index=now.month-1)
-        cal_html = make_monthly_calendar_html(int(picked_year), int(picked_month), user)
-        st.markdown(cal_html, unsafe_allow_html=True)
+            picked_month = st.selectbox("Month", list(range(1,13)), index=today.month-1)
+        cal_html = make_monthly_calendar_html(int(picked_year), int(picked_month), user,
+                                              calendar_data_version())
+        st.html(cal_html)
 
     st.write("---")
     st.subheader("Daily Challenges")
@@ -638,94 +1182,128 @@ def show_home_tab():
 
     st.write("---")
     st.subheader("Today's Quick Stats")
-    tasks_today = tasks_data.get(user, {}).get(today_str, [])
-    st.write(f"- **Tasks Today**: {len(tasks_today)}")
+    st.write(f"- **Tasks Today**: {len(snap.tasks)}")
+    st.write(f"- **Appointments Today**: {len(snap.apps)}")
 
-    apps_today = appointments_data.get(user, {}).get(today_str, [])
-    st.write(f"- **Appointments Today**: {len(apps_today)}")
-
-    mood_today = mood_data.get(user, {}).get(today_str, None)
-    if mood_today is not None:
-        st.write(f"- **Mood**: {mood_today}/5")
+    if snap.mood is not None:
+        st.write(f"- **Mood**: {snap.mood}/5")
     else:
         st.write("- **Mood**: Not logged")
 
-    water_today = water_data.get(user, {}).get(today_str, 0.0)
-    st.write(f"- **Water Intake**: {water_today} L")
-
-    steps_today = steps_data.get(user, {}).get(today_str, 0)
-    st.write(f"- **Steps**: {steps_today}")
+    st.write(f"- **Water Intake**: {snap.water} L")
+    st.write(f"- **Steps**: {snap.steps}")
 
-    bp_today = bloodpressure_data.get(user, {}).get(today_str, None)
-    if bp_today:
-        st.write(f"- **Blood Pressure**: {bp_today['systolic']}/{bp_today['diastolic']} mmHg")
+    if snap.bp:
+        st.write(f"- **Blood Pressure**: {snap.bp['systolic']}/{snap.bp['diastolic']} mmHg")
 
 #############################################
 #  MAKE MONTHLY CALENDAR (SHOWING EVENTS)
 #############################################
-def make_monthly_calendar_html(year: int, month: int, user: str) -> str:
-    cal = calendar.Calendar(firstweekday=6)  # Sunday start
-    month_name = calendar.month_name[month]
-
-    user_tasks = tasks_data.get(user, {})
-    user_apps  = appointments_data.get(user, {})
-    user_rx    = prescriptions_data.get(user, {})
-
-    html = (f"<table style='border-collapse:collapse; width:100%; font-size:14px;'>"
-            f"<caption style='text-align:center; font-weight:bold; font-size:18px; margin-bottom:8px;'>"
-            f"{month_name} {year}</caption>")
+# Stores the calendar reads; their held versions key its cache
+CALENDAR_STORES = ("tasks", "appointments", "prescriptions")
+
+def calendar_data_version() -> tuple:
+    """Versions of the calendar's stores as this session last loaded or
+    saved them, so the key matches the data being rendered rather than
+    whatever is on disk right now."""
+    return tuple(_session_stores[name][0] for name in CALENDAR_STORES)
+
+def rx_by_date(user_rx: dict) -> dict:
+    """Invert a user's schedules into {date: ["Rx [status]", ...]} in one
+    pass, so each calendar cell is a single dict lookup."""
+    index = defaultdict(list)
+    for rx_name, rx_info in user_rx.items():
+        for d_str, status in rx_info.get("Schedule", EMPTY_SCHEDULE).items():
+            index[d_str].append(f"{rx_name} [{status}]")
+    return index
+
+MONTH_NAMES = tuple(calendar.month_name)
+
+# Calendar markup templates, formatted once per item / cell
+_CAL_STYLE     = "border:1px solid #999; vertical-align:top; padding:6px;"
+_CAL_CELL_OPEN = "<td style='" + _CAL_STYLE + "'><strong>{}</strong>"
+_CAL_PAD       = "<td style='" + _CAL_STYLE + " color:#CCC;'>{}</td>"
+_CAL_LIST      = "<u>{}</u>:<ul style='margin:0; padding-left:14px;'>{}</ul>"
+_CAL_ITEM      = "<li>{}</li>".format
+_CAL_TASK      = "<li>{name} @ {time}</li>".format_map
+
+@st.cache_resource(max_entries=128, show_spinner=False)
+def month_layout(year: int, month: int) -> tuple:
+    """Sunday-first weeks of (ISO date, day number) cells; the date is None
+    for padding days from the neighbouring months. Shared and immutable."""
+    return tuple(
+        tuple((day.isoformat() if day.month == month else None, day.day) for day in week)
+        for week in calendar.Calendar(firstweekday=6).monthdatescalendar(year, month)
+    )
+
+@st.cache_resource(max_entries=128, show_spinner=False)
+def month_skeleton(year: int, month: int) -> tuple:
+    """The month's table partially evaluated: everything that doesn't depend
+    on user data (caption, header, rows, padding cells, day numbers) is
+    pre-joined into static chunks. Returns ((static_html, day_str), ...)
+    where each day_str marks the event slot that follows its chunk, plus
+    the closing html."""
+    segments = []
+    static = [f"<table style='border-collapse:collapse; width:100%; font-size:14px;'>"
+              f"<caption style='text-align:center; font-weight:bold; font-size:18px; margin-bottom:8px;'>"
+              f"{MONTH_NAMES[month]} {year}</caption>"]
 
     days_of_week = ["Sun","Mon","Tue","Wed","Thu","Fri","Sat"]
-    html += "<thead><tr>"
+    static.append("<thead><tr>")
     for dow in days_of_week:
-        html += f"<th style='border:1px solid #999; padding:6px; background-color:#DDD;'>{dow}</th>"
-    html += "</tr></thead>"
-
-    html += "<tbody>"
-    for week in cal.monthdatescalendar(year, month):
-        html += "<tr>"
-        for day in week:
-            style = "border:1px solid #999; vertical-align:top; padding:6px;"
-            if day.month == month:
-                day_str = day.strftime("%Y-%m-%d")
-                content_html = f"<strong>{day.day}</strong>"
-                day_events = []
-
-                # tasks
-                day_tasks = user_tasks.get(day_str, [])
-                if day_tasks:
-                    day_events.append("<u>Tasks</u>:<ul style='margin:0; padding-left:14px;'>"
-                                      + "".join([f"<li>{t['name']} @ {t['time']}</li>" for t in day_tasks])
-                                      + "</ul>")
-
-                # appointments
-                day_apps = user_apps.get(day_str, [])
-                if day_apps:
-                    day_events.append("<u>Appointments</u>:<ul style='margin:0; padding-left:14px;'>"
-                                      + "".join([f"<li>{a}</li>" for a in day_apps])
-                                      + "</ul>")
-
-                # prescriptions
-                presc_list = []
-                for rx_name, rx_info in user_rx.items():
-                    sched = rx_info.get("Schedule", [])
-                    for entry in sched:
-                        if (entry["Year"] == day.year and entry["Month"] == day.month and entry["Day"] == day.day):
-                            stt = entry.get("Status", "scheduled")
-                            presc_list.append(f"{rx_name} [{stt}]")
-                if presc_list:
-                    day_events.append("<u>Prescriptions</u>:<ul style='margin:0; padding-left:14px;'>"
-                                      + "".join([f"<li>{p}</li>" for p in presc_list])
-                                      + "</ul>")
-
-                if day_events:
-                    content_html += "<br>" + "<br>".join(day_events)
-                html += f"<td style='{style}'>{content_html}</td>"
+        static.append(f"<th style='border:1px solid #999; padding:6px; background-color:#DDD;'>{dow}</th>")
+    static.append("</tr></thead><tbody>")
+
+    for week in month_layout(year, month):
+        static.append("<tr>")
+        for day_str, day_num in week:
+            if day_str is not None:
+                static.append(_CAL_CELL_OPEN.format(day_num))
+                segments.append(("".join(static), day_str))
+                static = ["</td>"]
             else:
-                html += f"<td style='{style} color:#CCC;'>{day.day}</td>"
-        html += "</tr>"
-    html += "</tbody></table>"
-    return html
+                static.append(_CAL_PAD.format(day_num))
+        static.append("</tr>")
+    static.append("</tbody></table>")
+    return tuple(segments), "".join(static)
+
+def day_events_html(day_str: str, user_tasks: dict, user_apps: dict, rx_index: dict) -> str:
+    """The event lists shown under one day number ("" if nothing is on)."""
+    day_events = []
+
+    # tasks
+    day_tasks = user_tasks.get(day_str)
+    if day_tasks:
+        day_events.append(_CAL_LIST.format("Tasks", "".join(map(_CAL_TASK, day_tasks))))
+
+    # appointments
+    day_apps = user_apps.get(day_str)
+    if day_apps:
+        day_events.append(_CAL_LIST.format("Appointments", "".join(map(_CAL_ITEM, day_apps))))
+
+    # prescriptions
+    presc_list = rx_index.get(day_str)
+    if presc_list:
+        day_events.append(_CAL_LIST.format("Prescriptions", "".join(map(_CAL_ITEM, presc_list))))
+
+    return "<br>" + "<br>".join(day_events) if day_events else ""
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def make_monthly_calendar_html(year: int, month: int, user: str, data_version: tuple) -> str:
+    """Month table with the user's tasks, appointments and doses. Cached per
+    (year, month, user, data_version); data_version only keys the cache."""
+    user_tasks = tasks_data.get(user, {})
+    user_apps  = appointments_data.get(user, {})
+    rx_index   = rx_by_date(prescriptions_data.get(user, {}))
+
+    # Only the per-day event slots are filled in; the rest is pre-built
+    segments, tail = month_skeleton(year, month)
+    parts = []
+    for static, day_str in segments:
+        parts.append(static)
+        parts.append(day_events_html(day_str, user_tasks, user_apps, rx_index))
+    parts.append(tail)
+    return "".join(parts)
 
 #############################################
 #  TASKS & APPOINTMENTS TAB
@@ -733,25 +1311,16 @@ def make_monthly_calendar_html(year: int, month: int, user: str) -> str:
 def show_tasks_appointments_tab():
     st.header("Tasks & Appointments")
     user = st.session_state["current_user"]
-    if user not in tasks_data:
-        tasks_data[user] = {}
-    if user not in appointments_data:
-        appointments_data[user] = {}
 
-    sel_date = st.date_input("Select date", value=datetime.now())
-    date_str = sel_date.strftime("%Y-%m-%d")
+    sel_date = st.date_input("Select date", value=st.session_state["_today"])
+    date_str = sel_date.isoformat()
     st.write(f"Selected date: **{date_str}**")
 
-    # Ensure date keys
-    if date_str not in tasks_data[user]:
-        tasks_data[user][date_str] = []
-    if date_str not in appointments_data[user]:
-        appointments_data[user][date_str] = []
-
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Tasks")
-        day_tasks = tasks_data[user][date_str]
+        # Read-only lookup; the store only grows when something is saved
+        day_tasks = tasks_data.get(user, {}).get(date_str, ())
         if day_tasks:
             for i, tsk in enumerate(day_tasks):
                 st.write(f"{i+1}. **{tsk['name']}** @ {tsk['time']} (Status: {tsk['status']})")
@@ -764,19 +1333,19 @@ def show_tasks_appointments_tab():
             tstatus = st.selectbox("Status", ["Pending","In-progress","Completed"], key="task_status")
             if st.button("Save Task"):
                 if tname and ttime:
-                    tasks_data[user][date_str].append({
+                    tasks_data.setdefault(user, {}).setdefault(date_str, []).append({
                         "name": tname,
                         "time": ttime,
                         "status": tstatus
                     })
-                    save_all()
+                    mark_dirty("tasks")
                     st.success("Task added.")
                 else:
                     st.error("Task name and time are required.")
 
     with col2:
         st.subheader("Appointments")
-        day_apps = appointments_data[user][date_str]
+        day_apps = appointments_data.get(user, {}).get(date_str, ())
         if day_apps:
             for i, a in enumerate(day_apps):
                 st.write(f"{i+1}. {a}")
@@ -790,8 +1359,8 @@ def show_tasks_appointments_tab():
             if st.button("Save Appointment", key="btn_save_appt"):
                 if ap_time and ap_doc and ap_loc:
                     desc = f"{ap_time} with Dr. {ap_doc} @ {ap_loc}"
-                    appointments_data[user][date_str].append(desc)
-                    save_all()
+                    appointments_data.setdefault(user, {}).setdefault(date_str, []).append(desc)
+                    mark_dirty("appointments")
                     st.success("Appointment added.")
                 else:
                     st.error("All fields required.")
@@ -799,62 +1368,77 @@ def show_tasks_appointments_tab():
 #############################################
 #  PRESCRIPTIONS TAB
 #############################################
+# date.weekday() numbers (Mon=0..Sun=6); days may be separated by commas
+# and/or whitespace
+_DAY_MAP = {
+    "mon": 0, "tue": 1, "wed": 2,
+    "thu": 3, "fri": 4, "sat": 5, "sun": 6
+}
+_DAY_SPLIT = re.compile(r"[,\s]+")
+# Longest schedule accepted, so a typo can't allocate an unbounded span
+MAX_SCHEDULE_WEEKS = 520
+
+# Pure function of its three strings. st.cache_data rather than
+# functools.lru_cache: the script is re-executed on every rerun, which
+# would hand lru_cache a fresh, empty cache each time. cache_data also
+# returns a copy, so callers may mutate the schedule they get back.
+@st.cache_data(max_entries=256, show_spinner=False)
 def schedule_prescriptions(start_date_str, days_of_week_str, num_weeks):
-    try:
-        start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
-    except:
+    weeks = str(num_weeks).strip()
+    # isdecimal(), not isdigit(): digits such as "²" pass isdigit() but int() rejects them
+    if not weeks.isdecimal():
+        return None
+    w = int(weeks)
+    if w > MAX_SCHEDULE_WEEKS:
         return None
     try:
-        w = int(num_weeks)
-    except:
+        start_day = date.fromisoformat(start_date_str)
+    except (TypeError, ValueError):
         return None
-    day_map = {
-        "mon": 1, "tue": 2, "wed": 3,
-        "thu": 4, "fri": 5, "sat": 6, "sun": 7
-    }
-    raw_days = [x.strip().lower() for x in days_of_week_str.split(",") if x.strip()]
-    valid_days = [day_map[d] for d in raw_days if d in day_map]
-    schedule = []
-    for wk in range(w):
-        block_start = start_dt + timedelta(weeks=wk)
-        for dnum in valid_days:
-            offset = (dnum - block_start.isoweekday()) % 7
-            date_target = block_start + timedelta(days=offset)
-            schedule.append({
-                "Day": date_target.day,
-                "Month": date_target.month,
-                "Year": date_target.year,
-                "Status": "scheduled"
-            })
-    return schedule
+    valid_days = [_DAY_MAP[d] for d in _DAY_SPLIT.split(days_of_week_str.lower()) if d in _DAY_MAP]
+
+    # Every day of the w-week span at once, then keep the requested weekdays
+    all_days = np.datetime64(start_day, "D") + np.arange(7 * w)
+    # 1970-01-01 was a Thursday, so (days since epoch + 3) % 7 is Mon=0..Sun=6
+    weekdays = (all_days.astype("int64") + 3) % 7
+    picked = all_days[np.isin(weekdays, valid_days)]
+
+    # {date: status}, every dose starting out scheduled
+    return dict.fromkeys(np.datetime_as_string(picked, unit="D").tolist(), RX_SCHEDULED)
 
 def show_prescriptions_tab():
     st.header("Manage Prescriptions")
     user = st.session_state["current_user"]
-    if user not in prescriptions_data:
-        prescriptions_data[user] = {}
+    user_rx = prescriptions_data.setdefault(user, {})
+    # One key snapshot shared by both pickers (refreshed after a create)
+    rx_names = tuple(user_rx)
 
     st.subheader("Your Prescriptions")
-    if prescriptions_data[user]:
-        for rx_name, rx_info in list(prescriptions_data[user].items()):
-            with st.expander(rx_name):
+    if rx_names:
+        # The viewer sits in one slot so a delete can clear it in place
+        # rather than rerunning the whole script
+        rx_slot = st.empty()
+        with rx_slot.container():
+            # Only the picked prescription gets widgets, however many there are
+            rx_name = st.selectbox("Select Rx", rx_names, key="view_rx")
+            rx_info = user_rx[rx_name]
+            with st.expander(rx_name, expanded=True):
                 minfo = rx_info.get("Medication Info", {})
                 st.write(f"**Description**: {minfo.get('Description','N/A')}")
                 st.write(f"**Taken with food?** {minfo.get('Taken with food','N/A')}")
-                sched = rx_info.get("Schedule", [])
+                sched = rx_info.get("Schedule", EMPTY_SCHEDULE)
                 if sched:
-                    for entry in sched:
-                        y,m,d = entry["Year"], entry["Month"], entry["Day"]
-                        stt   = entry["Status"]
-                        st.write(f"- {y}-{m:02d}-{d:02d} [{stt}]")
+                    for d_str, stt in sched.items():
+                        st.write(f"- {d_str} [{stt}]")
                 else:
                     st.info("No schedule found.")
 
-                if st.button(f"Delete {rx_name}", key=f"del_{rx_name}"):
-                    del prescriptions_data[user][rx_name]
-                    save_all()
-                    st.success(f"Prescription '{rx_name}' deleted.")
-                    st.stop()
+                deleted = st.button(f"Delete {rx_name}", key="del_rx_btn")
+        if deleted:
+            del user_rx[rx_name]
+            rx_names = tuple(user_rx)
+            mark_dirty("prescriptions")
+            rx_slot.success(f"Prescription '{rx_name}' deleted.")
     else:
         st.info("No prescriptions found.")
 
@@ -863,44 +1447,42 @@ def show_prescriptions_tab():
     rxname_val = st.text_input("Prescription Name", key="rx_new_name")
     rxdesc_val = st.text_input("Description", key="rx_new_desc")
     rxfood_val = st.selectbox("Taken with food?", ["Yes","No"], key="rx_food")
-    rxstart    = st.date_input("Start Date", datetime.now(), key="rx_start")
+    rxstart    = st.date_input("Start Date", st.session_state["_today"], key="rx_start")
     rxdays     = st.text_input("Days of Week (Mon,Wed,Fri)", key="rx_days")
     rxweeks    = st.text_input("Number of Weeks", "4", key="rx_weeks")
 
     if st.button("Create Prescription", key="rx_btn_create"):
         if rxname_val.strip():
-            sched = schedule_prescriptions(rxstart.strftime("%Y-%m-%d"), rxdays, rxweeks)
+            sched = schedule_prescriptions(rxstart.isoformat(), rxdays, rxweeks)
             if sched is None:
                 st.error("Invalid scheduling data.")
             else:
-                prescriptions_data[user][rxname_val] = {
+                user_rx[rxname_val] = {
                     "Medication Info": {
                         "Description": rxdesc_val,
                         "Taken with food": rxfood_val
                     },
-                    "Schedule": sched
+                    # Re-interned: the cached schedule comes back unpickled
+                    "Schedule": {sys.intern(d): RX_SCHEDULED for d in sched}
                 }
-                save_all()
+                rx_names = tuple(user_rx)
+                mark_dirty("prescriptions")
                 st.success(f"Prescription '{rxname_val}' created with {len(sched)} entries.")
         else:
             st.error("Name is required.")
 
     st.write("---")
     st.subheader("Update Prescription Status")
-    if prescriptions_data[user]:
-        pick_rx = st.selectbox("Select Prescription", list(prescriptions_data[user].keys()))
-        upd_date = st.date_input("Date to Update", datetime.now(), key="upd_rx_date")
-        upd_status = st.selectbox("New Status", ["scheduled","taken on time","missed"], key="upd_rx_status")
+    if rx_names:
+        pick_rx = st.selectbox("Select Prescription", rx_names)
+        upd_date = st.date_input("Date to Update", st.session_state["_today"], key="upd_rx_date")
+        upd_status = st.selectbox("New Status", RX_STATUSES, key="upd_rx_status")
         if st.button("Update Status", key="btn_upd_rx"):
-            found_entry = None
-            for e in prescriptions_data[user][pick_rx]["Schedule"]:
-                dt = datetime(e["Year"], e["Month"], e["Day"])
-                if dt.date() == upd_date:
-                    found_entry = e
-                    break
-            if found_entry:
-                found_entry["Status"] = upd_status
-                save_all()
+            sched = user_rx[pick_rx].get("Schedule", EMPTY_SCHEDULE)
+            date_key = upd_date.isoformat()
+            if date_key in sched:
+                sched[date_key] = upd_status
+                mark_dirty("prescriptions")
                 st.success("Prescription status updated.")
             else:
                 st.warning("No matching date found.")
@@ -911,120 +1493,251 @@ def show_prescriptions_tab():
 #############################################
 #   HEALTH TRACKING (with Blood Pressure)
 #############################################
+def height_m2(user: str) -> float:
+    """Square of the user's height in metres, the BMI divisor. Kept in
+    session state until the profile is saved again."""
+    cached = st.session_state.get("_height_m2")
+    if cached is None or cached[0] != user:
+        # Profiles start with height_cm None; fall back like the settings form
+        user_height = users_data[user]["profile"].get("height_cm") or 170
+        if user_height <= 0:
+            user_height = 170
+        cached = st.session_state["_height_m2"] = (user, (user_height/100)**2)
+    return cached[1]
+
+def begin_panel(user: str, *names: str) -> str:
+    """Start of a health panel. A fragment rerun skips main() and with it
+    load_all_data(), so re-read any of the panel's stores another session
+    has written since (saving a stale copy would erase their entries), and
+    read the clock afresh so a click after midnight logs to the new day.
+    It skips main()'s final flush as well, so each panel ends with its own
+    flush_if_dirty(). Returns today's date string."""
+    refresh_stores(names)
+    for name in names:
+        _stores[name].setdefault(user, {})
+    refresh_clock()
+    return st.session_state["_today_str"]
+
+# Each panel is a fragment: its buttons rerun only that panel, not the
+# whole app.
+@st.fragment
+def _mood_sleep_panel(user: str):
+    """Mood and sleep logging."""
+    today_str = begin_panel(user, "mood", "sleep")
+    st.subheader("Mood")
+    curr_mood = mood_data[user].get(today_str, None)
+    st.write(f"Today: {curr_mood}/5" if curr_mood is not None else "No mood logged.")
+    new_mood = st.slider("Set Mood (1–5)", 1, 5, 3)
+    if st.button("Save Mood"):
+        append_log("mood", user, today_str, new_mood)
+        st.success("Mood updated.")
+
+    st.subheader("Sleep")
+    curr_sleep = sleep_data[user].get(today_str, None)
+    st.write(f"Today: {curr_sleep} hours" if curr_sleep else "Not logged.")
+    new_sleep = st.number_input("Sleep (hrs)", 0.0, 24.0, 7.0, step=0.5)
+    if st.button("Log Sleep"):
+        sleep_data[user][today_str] = new_sleep
+        mark_dirty("sleep")
+        st.success("Sleep logged.")
+
+    flush_if_dirty()
+
+@st.fragment
+def _water_steps_panel(user: str):
+    """Water and step logging."""
+    today_str = begin_panel(user, "water", "steps")
+    st.subheader("Water Intake")
+    curr_water = water_data[user].get(today_str, 0.0)
+    st.write(f"Today so far: {curr_water} L")
+    add_water = st.number_input("Liters to add", 0.0, 10.0, 0.5, step=0.25)
+    if st.button("Add Water"):
+        new_total = curr_water + add_water
+        append_log("water", user, today_str, new_total)
+        st.success(f"Water updated: {new_total} L")
+
+    st.subheader("Steps")
+    curr_steps = steps_data[user].get(today_str, 0)
+    st.write(f"Today so far: {curr_steps} steps")
+    add_stp = st.number_input("Steps to add", 0, 30000, 1000, step=500)
+    if st.button("Add Steps"):
+        new_st = curr_steps + add_stp
+        steps_data[user][today_str] = new_st
+        mark_dirty("steps")
+        st.success(f"Steps updated: {new_st}")
+
+    flush_if_dirty()
+
+@st.fragment
+def _body_metrics_panel(user: str):
+    """Weight/BMI, blood pressure and calorie logging."""
+    today_str = begin_panel(user, "weight", "bloodpressure", "calories")
+    st.subheader("Weight & BMI")
+    w_dict = weight_data[user].get(today_str, None)
+    if w_dict:
+        st.write(f"Today: {w_dict['weight_kg']} kg (BMI: {w_dict['bmi']:.1f})")
+    else:
+        st.write("No weight logged today.")
+
+    w_kg = st.number_input("Weight (kg)", 30.0, 300.0, 70.0)
+    if st.button("Log Weight"):
+        bmi_val = round(w_kg / height_m2(user), 1)
+        weight_data[user][today_str] = {"weight_kg": w_kg, "bmi": bmi_val}
+        mark_dirty("weight")
+        st.success(f"Weight logged: {w_kg} kg (BMI={bmi_val:.1f})")
+
+    st.subheader("Blood Pressure")
+    bp_entry = bloodpressure_data[user].get(today_str, None)
+    if bp_entry:
+        st.write(f"Today: {bp_entry['systolic']}/{bp_entry['diastolic']} mmHg")
+    sys_val = st.number_input("Systolic", 70, 250, 120, step=1)
+    dia_val = st.number_input("Diastolic", 40, 180, 80, step=1)
+    if st.button("Save BP"):
+        bloodpressure_data[user][today_str] = {
+            "systolic": sys_val,
+            "diastolic": dia_val
+        }
+        mark_dirty("bloodpressure")
+        st.success(f"Blood pressure logged: {sys_val}/{dia_val} mmHg")
+
+    st.subheader("Calories")
+    cal_today = calories_data[user].get(today_str, 0)
+    st.write(f"Today: {cal_today} kcal")
+    add_cal = st.number_input("Add Calories", 0, 5000, 500, step=100)
+    if st.button("Add Calories"):
+        new_cal = cal_today + add_cal
+        calories_data[user][today_str] = new_cal
+        mark_dirty("calories")
+        st.success(f"Calories updated: {new_cal}")
+
+    flush_if_dirty()
+
 def show_health_tracking_tab():
     st.header("Health Tracking")
     user = st.session_state["current_user"]
-    today_str = datetime.now().strftime("%Y-%m-%d")
-
-    # ensure subdict
-    if user not in mood_data:
-        mood_data[user] = {}
-    if user not in water_data:
-        water_data[user] = {}
-    if user not in steps_data:
-        steps_data[user] = {}
-    if user not in sleep_data:
-        sleep_data[user] = {}
-    if user not in weight_data:
-        weight_data[user] = {}
-    if user not in calories_data:
-        calories_data[user] = {}
-    if user not in bloodpressure_data:
-        bloodpressure_data[user] = {}
 
+    # Each panel refreshes its own stores and makes sure the user has an entry
     col1, col2, col3 = st.columns(3)
-
-    # MOOD + SLEEP
     with col1:
-        st.subheader("Mood")
-        curr_mood = mood_data[user].get(today_str, None)
-        st.write(f"Today: {curr_mood}/5" if curr_mood is not None else "No mood logged.")
-        new_mood = st.slider("Set Mood (1–5)", 1, 5, 3)
-        if st.button("Save Mood"):
-            mood_data[user][today_str] = new_mood
-            save_all()
-            st.success("Mood updated.")
-
-        st.subheader("Sleep")
-        curr_sleep = sleep_data[user].get(today_str, None)
-        st.write(f"Today: {curr_sleep} hours" if curr_sleep else "Not logged.")
-        new_sleep = st.number_input("Sleep (hrs)", 0.0, 24.0, 7.0, step=0.5)
-        if st.button("Log Sleep"):
-            sleep_data[user][today_str] = new_sleep
-            save_all()
-            st.success("Sleep logged.")
-
-    # WATER + STEPS
+        _mood_sleep_panel(user)
     with col2:
-        st.subheader("Water Intake")
-        curr_water = water_data[user].get(today_str, 0.0)
-        st.write(f"Today so far: {curr_water} L")
-        add_water = st.number_input("Liters to add", 0.0, 10.0, 0.5, step=0.25)
-        if st.button("Add Water"):
-            new_total = curr_water + add_water
-            water_data[user][today_str] = new_total
-            save_all()
-            st.success(f"Water updated: {new_total} L")
-
-        st.subheader("Steps")
-        curr_steps = steps_data[user].get(today_str, 0)
-        st.write(f"Today so far: {curr_steps} steps")
-        add_stp = st.number_input("Steps to add", 0, 30000, 1000, step=500)
-        if st.button("Add Steps"):
-            new_st = curr_steps + add_stp
-            steps_data[user][today_str] = new_st
-            save_all()
-            st.success(f"Steps updated: {new_st}")
-
-    # WEIGHT + BP + CALORIES
+        _water_steps_panel(user)
     with col3:
-        st.subheader("Weight & BMI")
-        w_dict = weight_data[user].get(today_str, None)
-        if w_dict:
-            st.write(f"Today: {w_dict['weight_kg']} kg (BMI: {w_dict['bmi']:.1f})")
-        else:
-            st.write("No weight logged today.")
-
-        w_kg = st.number_input("Weight (kg)", 30.0, 300.0, 70.0)
-        user_height = users_data[user]["profile"].get("height_cm", 170)
-        if user_height <= 0:
-            user_height = 170
-        if st.button("Log Weight"):
-            bmi_val = round(w_kg / ((user_height/100)**2), 1)
-            weight_data[user][today_str] = {"weight_kg": w_kg, "bmi": bmi_val}
-            save_all()
-            st.success(f"Weight logged: {w_kg} kg (BMI={bmi_val:.1f})")
-
-        st.subheader("Blood Pressure")
-        bp_entry = bloodpressure_data[user].get(today_str, None)
-        if bp_entry:
-            st.write(f"Today: {bp_entry['systolic']}/{bp_entry['diastolic']} mmHg")
-        sys_val = st.number_input("Systolic", 70, 250, 120, step=1)
-        dia_val = st.number_input("Diastolic", 40, 180, 80, step=1)
-        if st.button("Save BP"):
-            bloodpressure_data[user][today_str] = {
-                "systolic": sys_val,
-                "diastolic": dia_val
-            }
-            save_all()
-            st.success(f"Blood pressure logged: {sys_val}/{dia_val} mmHg")
-
-        st.subheader("Calories")
-        cal_today = calories_data[user].get(today_str, 0)
-        st.write(f"Today: {cal_today} kcal")
-        add_cal = st.number_input("Add Calories", 0, 5000, 500, step=100)
-        if st.button("Add Calories"):
-            new_cal = cal_today + add_cal
-            calories_data[user][today_str] = new_cal
-            save_all()
-            st.success(f"Calories updated: {new_cal}")
+        _body_metrics_panel(user)
 
 #############################################
 #  ANALYTICS TAB
 #############################################
+@st.cache_data(max_entries=16, show_spinner=False)
+def recent_dates(today_str: str, n: int) -> list:
+    """ISO date strings for the n days ending at today_str, oldest first."""
+    # One arange and one vectorised format instead of n timedelta/isoformat calls
+    days = np.datetime64(today_str, "D") - np.arange(n - 1, -1, -1)
+    return np.datetime_as_string(days, unit="D").tolist()
+
+# Both windows probe the store once per day in the window rather than
+# loading the user's whole history into pandas and reindexing it down.
+def series_window(per_date: dict, dates: list, fill=0.0) -> np.ndarray:
+    """Values of a {date: number} dict over `dates`; days without an entry
+    get `fill`."""
+    return np.fromiter((per_date.get(d, fill) for d in dates), dtype="float64", count=len(dates))
+
+def frame_window(per_date: dict, dates: list, columns: list) -> pd.DataFrame:
+    """{date: {field: value}} entries projected onto `dates`; missing
+    days/fields are NaN, which the charts draw as gaps."""
+    rows = {d: row for d in dates if (row := per_date.get(d)) is not None}
+    return pd.DataFrame.from_dict(rows, orient="index").reindex(index=dates, columns=columns)
+
+def window_is_empty(values: np.ndarray) -> bool:
+    """True when a window holds nothing but its zero/NaN fill."""
+    return not np.nan_to_num(values).any()
+
+def store_version(name: str) -> tuple:
+    """Version of a store as this session last loaded or saved it."""
+    return _session_stores[name][0]
+
+# Longest window any analytics chart shows; shorter views slice its tail
+SERIES_DAYS = 30
+
+# The windowed series below are keyed on the store's file version rather
+# than on a snapshot of the data, so a cache hit costs one stat() instead
+# of hashing the user's whole history. Each (store, user) keeps a single
+# SERIES_DAYS window as NumPy arrays, which copy out of the cache as flat
+# buffers rather than as one Python float per day.
+@st.cache_data(ttl=24*60*60, max_entries=256, show_spinner=False)
+def daily_series(name: str, user: str, today_str: str, version: tuple) -> tuple:
+    """(dates, values) arrays of one user's {date: number} store over the
+    SERIES_DAYS days ending at today_str."""
+    dates = recent_dates(today_str, SERIES_DAYS)
+    return np.array(dates), series_window(_stores[name].get(user, {}), dates)
+
+@st.cache_data(ttl=24*60*60, max_entries=256, show_spinner=False)
+def daily_columns(name: str, user: str, today_str: str, columns: tuple, version: tuple) -> tuple:
+    """(dates, values) arrays of one user's {date: {field: value}} store over
+    the SERIES_DAYS days ending at today_str; values has one column per field."""
+    dates = recent_dates(today_str, SERIES_DAYS)
+    frame = frame_window(_stores[name].get(user, {}), dates, list(columns))
+    return np.array(dates), frame.to_numpy(dtype="float64")
+
+@st.cache_data(ttl=24*60*60, max_entries=256, show_spinner=False)
+def status_counts(user: str, version: tuple) -> tuple:
+    """(statuses, counts) over all of a user's prescription schedules."""
+    # Seeded so the three standard statuses always show, in this order;
+    # update() then counts every entry in one C-level pass
+    statuses = Counter(dict.fromkeys(RX_STATUSES, 0))
+    statuses.update(stt for rx_info in prescriptions_data.get(user, {}).values()
+                    for stt in rx_info.get("Schedule", EMPTY_SCHEDULE).values())
+    return tuple(statuses.keys()), tuple(statuses.values())
+
+# The time-series charts are drawn by Vega-Lite in the browser, so the
+# server only ships their data
+def series_frame(dates: tuple, temporal: bool = False, **columns) -> pd.DataFrame:
+    """Chart data: one column per keyword, indexed by ISO date. A temporal
+    index gets a time axis, which thins its own labels instead of drawing
+    (and rotating) one per day."""
+    if temporal:
+        # ISO strings parse to datetime64 in one NumPy cast
+        index = pd.DatetimeIndex(np.asarray(dates, dtype="datetime64[D]"), name="date")
+    else:
+        index = pd.Index(dates, name="date")
+    return pd.DataFrame(columns, index=index)
+
+def weight_chart_spec() -> dict:
+    """Vega-Lite layers for weight and BMI on independent y axes."""
+    x = {"field": "date", "type": "temporal", "title": None,
+         "axis": {"format": "%b %d", "labelAngle": 0, "tickCount": 7}}
+    return {
+        "layer": [
+            {"mark": {"type": "line", "point": True, "color": "blue"},
+             "encoding": {"x": x, "y": {"field": "weight_kg", "type": "quantitative", "title": "Weight (kg)"}}},
+            {"mark": {"type": "line", "point": {"shape": "square"}, "color": "orange"},
+             "encoding": {"x": x, "y": {"field": "bmi", "type": "quantitative", "title": "BMI"}}}
+        ],
+        "resolve": {"scale": {"y": "independent"}}
+    }
+
+def status_pie_spec() -> dict:
+    """Vega-Lite arc chart of status counts, with each share in the tooltip."""
+    return {
+        "title": "Prescription Status Overview",
+        "transform": [
+            {"joinaggregate": [{"op": "sum", "field": "count", "as": "total"}]},
+            {"calculate": "datum.count / datum.total", "as": "share"}
+        ],
+        "mark": {"type": "arc", "tooltip": True},
+        "encoding": {
+            "theta": {"field": "count", "type": "quantitative"},
+            "color": {"field": "status", "type": "nominal", "title": None, "sort": list(RX_STATUSES)},
+            "tooltip": [{"field": "status", "type": "nominal"},
+                        {"field": "count", "type": "quantitative"},
+                        {"field": "share", "type": "quantitative", "format": ".1%"}]
+        }
+    }
+
 def show_analytics_tab():
     st.header("Analytics & Trends")
     user = st.session_state["current_user"]
+    today_str = st.session_state["_today_str"]
     sub_tab = st.selectbox("Analytics Sections", [
         "Water Intake", 
         "Mood History", 
@@ -1038,73 +1751,52 @@ def show_analytics_tab():
     if sub_tab == "Water Intake":
         st.subheader("Water (Last 14 Days)")
         w_dict = water_data.get(user, {})
-        datelist, vals = [], []
-        for i in range(14):
-            d_str = (datetime.now()-timedelta(days=13-i)).strftime("%Y-%m-%d")
-            datelist.append(d_str)
-            vals.append(w_dict.get(d_str, 0.0))
-        fig, ax = plt.subplots()
-        ax.bar(datelist, vals, color="blue")
-        ax.set_xticklabels(datelist, rotation=45, ha="right")
-        ax.set_ylabel("Liters")
-        ax.set_title("Water Intake")
-        st.pyplot(fig)
+        if not w_dict:
+            st.info("No water intake logs found.")
+            return
+        datelist, vals = daily_series("water", user, today_str, store_version("water"))
+        if window_is_empty(vals[-14:]):
+            st.info("No water intake logged in the last 14 days.")
+            return
+        st.bar_chart(series_frame(datelist[-14:], Liters=vals[-14:]), y_label="Liters", color="#0000ff")
 
     elif sub_tab == "Mood History":
         st.subheader("Mood (Last 14 Days)")
         m_dict = mood_data.get(user, {})
-        datelist, moods = [], []
-        for i in range(14):
-            d_str = (datetime.now()-timedelta(days=13-i)).strftime("%Y-%m-%d")
-            datelist.append(d_str)
-            moods.append(m_dict.get(d_str, 0))
-        fig, ax = plt.subplots()
-        ax.plot(datelist, moods, marker="o", color="red")
-        ax.set_xticklabels(datelist, rotation=45, ha="right")
-        ax.set_yticks([1,2,3,4,5])
-        ax.set_title("Mood Trend")
-        st.pyplot(fig)
+        if not m_dict:
+            st.info("No mood logs found.")
+            return
+        datelist, moods = daily_series("mood", user, today_str, store_version("mood"))
+        if window_is_empty(moods[-14:]):
+            st.info("No mood logged in the last 14 days.")
+            return
+        st.line_chart(series_frame(datelist[-14:], temporal=True, Mood=moods[-14:]), y_label="Mood", color="#ff0000")
 
     elif sub_tab == "Steps History":
         st.subheader("Steps (Last 14 Days)")
         s_dict = steps_data.get(user, {})
-        datelist, stepsvals = [], []
-        for i in range(14):
-            d_str = (datetime.now()-timedelta(days=13-i)).strftime("%Y-%m-%d")
-            datelist.append(d_str)
-            stepsvals.append(s_dict.get(d_str, 0))
-        fig, ax = plt.subplots()
-        ax.bar(datelist, stepsvals, color="green")
-        ax.set_xticklabels(datelist, rotation=45, ha="right")
-        ax.set_title("Steps Trend")
-        st.pyplot(fig)
+        if not s_dict:
+            st.info("No step logs found.")
+            return
+        datelist, stepsvals = daily_series("steps", user, today_str, store_version("steps"))
+        if window_is_empty(stepsvals[-14:]):
+            st.info("No steps logged in the last 14 days.")
+            return
+        st.bar_chart(series_frame(datelist[-14:], Steps=stepsvals[-14:]), y_label="Steps", color="#008000")
 
     elif sub_tab == "Weight/BMI Progress":
         st.subheader("Weight & BMI (Last 30 Days)")
         w_dict = weight_data.get(user, {})
-        datelist, weights, bmis = [], [], []
-        for i in range(30):
-            d_str = (datetime.now()-timedelta(days=29-i)).strftime("%Y-%m-%d")
-            datelist.append(d_str)
-            if d_str in w_dict:
-                weights.append(w_dict[d_str]["weight_kg"])
-                bmis.append(w_dict[d_str]["bmi"])
-            else:
-                weights.append(None)
-                bmis.append(None)
-        fig, ax = plt.subplots()
-        ax.plot(datelist, weights, marker="o", color="blue", label="Weight (kg)")
-        ax2 = ax.twinx()
-        ax2.plot(datelist, bmis, marker="s", color="orange", label="BMI")
-
-        ax.set_xticklabels(datelist, rotation=45, ha="right")
-        ax.set_ylabel("Weight (kg)")
-        ax2.set_ylabel("BMI")
-        ax.set_title("Weight & BMI")
-        lines1, labels1 = ax.get_legend_handles_labels()
-        lines2, labels2 = ax2.get_legend_handles_labels()
-        ax2.legend(lines1+lines2, labels1+labels2, loc="upper left")
-        st.pyplot(fig)
+        if not w_dict:
+            st.info("No weight logs found.")
+            return
+        datelist, vals = daily_columns("weight", user, today_str, ("weight_kg", "bmi"),
+                                       store_version("weight"))
+        if window_is_empty(vals):
+            st.info("No weight logged in the last 30 days.")
+            return
+        st.vega_lite_chart(series_frame(datelist, temporal=True, weight_kg=vals[:, 0], bmi=vals[:, 1]).reset_index(),
+                           weight_chart_spec())
 
     elif sub_tab == "Prescription Status":
         st.subheader("Prescription Status Distribution")
@@ -1112,34 +1804,23 @@ def show_analytics_tab():
         if not rx_dict:
             st.info("No prescriptions found.")
             return
-        statuses = {"scheduled":0, "taken on time":0, "missed":0}
-        for rx_name, rx_info in rx_dict.items():
-            for e in rx_info.get("Schedule", []):
-                stt = e.get("Status","scheduled")
-                if stt not in statuses:
-                    statuses[stt] = 0
-                statuses[stt] += 1
-
-        labels, values = list(statuses.keys()), list(statuses.values())
-        fig, ax = plt.subplots()
-        ax.pie(values, labels=labels, autopct="%1.1f%%")
-        ax.set_title("Prescription Status Overview")
-        st.pyplot(fig)
+        labels, counts = status_counts(user, store_version("prescriptions"))
+        if not any(counts):
+            st.info("No scheduled doses found.")
+            return
+        st.vega_lite_chart(pd.DataFrame({"status": labels, "count": counts}), status_pie_spec())
 
     elif sub_tab == "Calorie Intake":
         st.subheader("Calorie Intake (Last 14 Days)")
         c_dict = calories_data.get(user, {})
-        datelist, calsvals = [], []
-        for i in range(14):
-            d_str = (datetime.now()-timedelta(days=13-i)).strftime("%Y-%m-%d")
-            datelist.append(d_str)
-            calsvals.append(c_dict.get(d_str, 0))
-        fig, ax = plt.subplots()
-        ax.bar(datelist, calsvals, color="purple")
-        ax.set_xticklabels(datelist, rotation=45, ha="right")
-        ax.set_ylabel("kcal")
-        ax.set_title("Calorie Intake")
-        st.pyplot(fig)
+        if not c_dict:
+            st.info("No calorie logs found.")
+            return
+        datelist, calsvals = daily_series("calories", user, today_str, store_version("calories"))
+        if window_is_empty(calsvals[-14:]):
+            st.info("No calories logged in the last 14 days.")
+            return
+        st.bar_chart(series_frame(datelist[-14:], kcal=calsvals[-14:]), y_label="kcal", color="#800080")
 
     elif sub_tab == "Blood Pressure History":
         st.subheader("Blood Pressure (Last 14 Days)")
@@ -1147,27 +1828,16 @@ def show_analytics_tab():
         if not bp_dict:
             st.info("No blood pressure logs found.")
             return
-        # We'll create lists for date, systolic, diastolic
-        datelist, sys_vals, dia_vals = [], [], []
-        for i in range(14):
-            d_str = (datetime.now()-timedelta(days=13-i)).strftime("%Y-%m-%d")
-            datelist.append(d_str)
-            entry = bp_dict.get(d_str, None)
-            if entry:
-                sys_vals.append(entry["systolic"])
-                dia_vals.append(entry["diastolic"])
-            else:
-                sys_vals.append(None)
-                dia_vals.append(None)
-
-        fig, ax = plt.subplots()
-        ax.plot(datelist, sys_vals, marker="o", color="red", label="Systolic")
-        ax.plot(datelist, dia_vals, marker="s", color="blue", label="Diastolic")
-        ax.set_xticklabels(datelist, rotation=45, ha="right")
-        ax.set_ylabel("mmHg")
-        ax.set_title("Blood Pressure Trend")
-        ax.legend()
-        st.pyplot(fig)
+        # We'll slice arrays for date, systolic, diastolic
+        datelist, vals = daily_columns("bloodpressure", user, today_str, ("systolic", "diastolic"),
+                                       store_version("bloodpressure"))
+        datelist, vals = datelist[-14:], vals[-14:]
+        if window_is_empty(vals):
+            st.info("No blood pressure logged in the last 14 days.")
+            return
+
+        st.line_chart(series_frame(datelist, temporal=True, Systolic=vals[:, 0], Diastolic=vals[:, 1]),
+                      y_label="mmHg", color=["#ff0000", "#0000ff"])
 
 #############################################
 #   SYMPTOM CHECKER TAB
@@ -1192,39 +1862,40 @@ def show_symptom_checker_tab():
 def show_notes_tab():
     st.header("Personal Notes / Journaling")
     user = st.session_state["current_user"]
-    today_str = datetime.now().strftime("%Y-%m-%d")
+    today_str = st.session_state["_today_str"]
 
-    if user not in notes_data:
-        notes_data[user] = {}
-    if today_str not in notes_data[user]:
-        notes_data[user][today_str] = []
+    day_notes = notes_data.setdefault(user, {}).setdefault(today_str, {})
 
     st.subheader(f"Notes for {today_str}")
-    day_notes = notes_data[user][today_str]
-    if day_notes:
-        for i, note_txt in enumerate(day_notes):
-            with st.expander(f"Note #{i+1}"):
-                st.write(note_txt)
-                if st.button(f"Delete Note #{i+1}", key=f"delnote_{i}"):
-                    day_notes.pop(i)
-                    save_all()
-                    st.success("Note deleted.")
-                    st.stop()
-    else:
-        st.info("No notes for today.")
+    # Filled in after the add form has run, so a note saved on this run is
+    # already listed and neither saving nor deleting needs another rerun
+    notes_area = st.container()
 
     st.write("---")
     with st.expander("Add a New Note"):
         new_note = st.text_area("Write your note:")
         if st.button("Save Note"):
             if new_note.strip():
-                notes_data[user][today_str].append(new_note.strip())
-                save_all()
+                day_notes[new_note_id()] = new_note.strip()
+                mark_dirty("notes")
                 st.success("Note saved.")
-                st.stop()
             else:
                 st.error("Cannot save an empty note.")
 
+    with notes_area:
+        for i, (nid, note_txt) in enumerate(list(day_notes.items()), 1):
+            slot = st.empty()
+            with slot.container(), st.expander(f"Note #{i}"):
+                st.write(note_txt)
+                deleted = st.button(f"Delete Note #{i}", key=f"delnote_{nid}")
+            if deleted:
+                del day_notes[nid]
+                mark_dirty("notes")
+                slot.empty()
+                st.toast("Note deleted.")
+        if not day_notes:
+            st.info("No notes for today.")
+
 #############################################
 #         SETTINGS TAB
 #############################################
@@ -1250,23 +1921,22 @@ def show_settings_tab():
                 "age": age_val,
                 "height_cm": height_val
             }
-            save_all()
+            st.session_state.pop("_height_m2", None)
+            mark_dirty("users")
             st.success("Profile updated.")
 
     with colB:
         st.subheader("SMTP / Email Config")
         st.write("Configure for email notifications (optional).")
-        smtp_host = st.text_input("SMTP Host", users_data[user]["smtp"].get("host",""))
-        smtp_port = st.number_input("SMTP Port", 1,99999, users_data[user]["smtp"].get("port",587))
-        smtp_user = st.text_input("SMTP Username", users_data[user]["smtp"].get("username",""))
-        smtp_pass = st.text_input("SMTP App Password", users_data[user]["smtp"].get("app_password",""), type="password")
+        smtp = users_data[user].setdefault("smtp", {})
+        smtp_host = st.text_input("SMTP Host", smtp.get("host",""))
+        smtp_port = st.number_input("SMTP Port", 1,99999, smtp.get("port",587))
+        smtp_user = st.text_input("SMTP Username", smtp.get("username",""))
+        smtp_pass = st.text_input("SMTP App Password", smtp.get("app_password",""), type="password")
 
         if st.button("Save SMTP"):
-            users_data[user]["smtp"]["host"]        = smtp_host
-            users_data[user]["smtp"]["port"]        = smtp_port
-            users_data[user]["smtp"]["username"]    = smtp_user
-            users_data[user]["smtp"]["app_password"]= smtp_pass
-            save_all()
+            smtp.update(host=smtp_host, port=smtp_port, username=smtp_user, app_password=smtp_pass)
+            mark_dirty("users")
             st.success("SMTP settings saved.")
 
     st.write("---")